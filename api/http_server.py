@@ -0,0 +1,181 @@
+import asyncio
+import json
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from services.query_service import QueryService, STOCK_MARKETS, MACRO_KINDS, COMMODITY_KINDS
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+# 單一請求 body 上限 (bytes)
+MAX_BODY_SIZE = 1024 * 1024
+
+STATUS_TEXT = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class HttpError(Exception):
+    """HTTP 錯誤回應"""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryHttpServer:
+    """
+    基本面查詢 HTTP 服務 (asyncio)
+
+    GET  /health
+    GET  /fundamentals/{market}/{symbol}
+    GET  /fundamentals/{market}?symbols=AAPL,MSFT
+    POST /fundamentals/{market}                 body: {"symbols": [...]}
+    GET  /macro/{cpi|nfp}[?start_date=yyyy/mm/dd&end_date=yyyy/mm/dd]
+    GET  /commodities/{oil|gold}[?start_date=yyyy/mm/dd&end_date=yyyy/mm/dd]
+    """
+    def __init__(self, query_service: QueryService = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.query_service = query_service or QueryService()
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # port 為 0 時取得實際綁定的 port
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            status, payload = await self._handle_request(reader)
+        except HttpError as e:
+            status, payload = e.status, {'error': str(e)}
+        except Exception as e:
+            status, payload = 500, {'error': str(e)}
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        header = (
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode('ascii')
+        try:
+            writer.write(header + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise HttpError(400, "無效的請求")
+        method, target, _ = parts
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        body = b''
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HttpError(400, "無效的 Content-Length")
+        if length < 0:
+            raise HttpError(400, "無效的 Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise HttpError(413, "請求內容過大")
+        if length:
+            body = await reader.readexactly(length)
+
+        url = urlsplit(target)
+        path = [unquote(p) for p in url.path.strip('/').split('/') if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        return 200, await self._route(method, path, query, body)
+
+    async def _route(self, method, path, query, body):
+        qs = self.query_service
+        if not path:
+            raise HttpError(404, "找不到路徑")
+        resource = path[0]
+
+        if resource == 'health' and len(path) == 1:
+            return {'status': 'ok'}
+
+        if resource == 'fundamentals' and len(path) in (2, 3):
+            market = path[1]
+            if market not in STOCK_MARKETS:
+                raise HttpError(400, f"不支援的市場類型: {market}")
+            if len(path) == 3:
+                self._require_method(method, 'GET')
+                return await self._call(qs.get_fundamentals(path[2], market))
+            if method == 'POST':
+                try:
+                    symbols = json.loads(body or b'{}').get('symbols') or []
+                except (ValueError, AttributeError):
+                    raise HttpError(400, "請求內容須為 JSON 物件")
+                if not isinstance(symbols, list) or not all(isinstance(s, str) and s for s in symbols):
+                    raise HttpError(400, "symbols 須為非空字串的陣列")
+            else:
+                self._require_method(method, 'GET')
+                symbols = [s for s in query.get('symbols', '').split(',') if s]
+            if not symbols:
+                raise HttpError(400, "請提供至少一個股票代號")
+            results, errors = await self._call(qs.get_fundamentals_batch(symbols, market))
+            return {'market': market, 'data': results, 'errors': errors}
+
+        if resource == 'macro' and len(path) == 2 and path[1] in MACRO_KINDS:
+            self._require_method(method, 'GET')
+            return await self._call(qs.get_macro(path[1], query.get('start_date'), query.get('end_date')))
+
+        if resource == 'commodities' and len(path) == 2 and path[1] in COMMODITY_KINDS:
+            self._require_method(method, 'GET')
+            return await self._call(qs.get_commodity(path[1], query.get('start_date'), query.get('end_date')))
+
+        raise HttpError(404, "找不到路徑")
+
+    @staticmethod
+    def _require_method(method, expected):
+        if method != expected:
+            raise HttpError(405, f"僅支援 {expected}")
+
+    @staticmethod
+    async def _call(coro):
+        try:
+            return await coro
+        except ValueError as e:
+            raise HttpError(400, str(e))
+
+
+def run_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, query_service: QueryService = None):
+    """啟動 HTTP 服務直到中斷"""
+    server = QueryHttpServer(query_service, host, port)
+
+    async def _main():
+        await server.start()
+        print(f"基本面查詢服務已啟動: http://{server.host}:{server.port}", flush=True)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        print("服務已停止")
@@ -1,6 +1,21 @@
 import sys
 import argparse
 from services.fundamental_data_service import FundamentalDataService
+from writers.stream_writer import open_stream_writer
+from api.http_server import run_server, DEFAULT_HOST, DEFAULT_PORT
+from services.refresh_queue_service import RefreshQueueService, DEFAULT_BATCH_SIZE, DEFAULT_LEASE_SECONDS
+from services.backfill_service import BackfillService, DEFAULT_WINDOW_DAYS, DEFAULT_SYMBOL_BATCH_SIZE
+from services.fx_normalization_service import DEFAULT_BASE_CURRENCY
+
+def positive_int(value):
+    """argparse 型別: 正整數"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"須為正整數: {value}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"須為正整數: {value}")
+    return number
 
 def format_number(value, format_type='general'):
     """格式化數字顯示"""
@@ -36,10 +51,14 @@ def display_fundamental_data(symbol, data):
     print(f"  國家: {data.get('country', 'N/A')}")
     print(f"  交易所: {data.get('exchange', 'N/A')}")
     print(f"  貨幣: {data.get('currency', 'N/A')}")
+    if data.get('financialCurrency') and data.get('financialCurrency') != data.get('currency'):
+        print(f"  財報貨幣: {data['financialCurrency']}")
     
     # 估值指標
     print("\n💰 估值指標:")
     print(f"  市值: {format_number(data.get('marketCap'), 'currency')}")
+    if data.get('marketCapBase') is not None and data.get('baseCurrency') != data.get('currency'):
+        print(f"  市值 ({data['baseCurrency']}): {format_number(data['marketCapBase'], 'currency')}")
     print(f"  本益比 (P/E): {format_number(data.get('trailingPE'), 'ratio')}")
     print(f"  預估本益比: {format_number(data.get('forwardPE'), 'ratio')}")
     print(f"  股價淨值比 (P/B): {format_number(data.get('priceToBook'), 'ratio')}")
@@ -83,6 +102,136 @@ def display_fundamental_data(symbol, data):
     print(f"  52週最低: {format_number(data.get('fiftyTwoWeekLow'), 'ratio')}")
     print(f"  平均成交量: {format_number(data.get('averageVolume'))}")
 
+def resolve_market(args):
+    """依命令列選項決定市場類型，未指定時回傳 None"""
+    for flag in ['tw', 'us', 'two', 'etf', 'index', 'crypto', 'forex', 'futures']:
+        if getattr(args, flag):
+            return flag
+    return None
+
+def stream_query(args):
+    """以 jsonl/csv/arrow 串流輸出查詢結果，進度與錯誤訊息一律輸出至 stderr"""
+    series_flags = [(args.cpi, 'cpi_us'), (args.nfp, 'nfp_us'), (args.oil, 'oil'), (args.gold, 'gold')]
+    series_market = next((market for flag, market in series_flags if flag), None)
+    market = None
+    if not series_market:
+        if not args.symbols:
+            print("請提供至少一個股票代號", file=sys.stderr)
+            return
+        market = resolve_market(args)
+        if market is None:
+            print("請指定市場類型 (例: --tw, --us, --crypto)", file=sys.stderr)
+            return
+
+    service = FundamentalDataService(args.base_currency)
+    try:
+        writer, stream = open_stream_writer(args.output, args.output_file)
+    except Exception as e:
+        print(f"✗ 無法建立輸出: {str(e)}", file=sys.stderr)
+        return
+    rows = None
+    try:
+        if series_market:
+            if args.start_date and args.end_date:
+                rows = service.iter_fetch_and_store_range(series_market, args.start_date, args.end_date)
+            else:
+                latest_fetchers = {
+                    'cpi_us': service.fetch_and_store_cpi_us,
+                    'nfp_us': service.fetch_and_store_nfp_us,
+                    'oil': service.fetch_and_store_oil_price,
+                    'gold': service.fetch_and_store_gold_price,
+                }
+                rows = [latest_fetchers[series_market]()]
+            for row in rows:
+                writer.write(row)
+        else:
+            for symbol, data, error in service.iter_fetch_and_store(args.symbols, market):
+                if error is not None:
+                    print(f"✗ {symbol} 處理失敗: {str(error)}", file=sys.stderr)
+                    continue
+                writer.write(data)
+    except Exception as e:
+        print(f"✗ 查詢失敗: {str(e)}", file=sys.stderr)
+    finally:
+        # 關閉產生器以寫入尚未儲存的批次，並輸出緩衝資料與串流結尾
+        try:
+            if hasattr(rows, 'close'):
+                rows.close()
+        except Exception as e:
+            print(f"✗ 儲存剩餘資料失敗: {str(e)}", file=sys.stderr)
+        try:
+            writer.close()
+        except Exception as e:
+            print(f"✗ 關閉輸出失敗: {str(e)}", file=sys.stderr)
+        if args.output_file:
+            stream.close()
+
+def print_backfill_stats(stats):
+    print(f"回補作業 {stats['job_id']}: 完成 {stats['done']} 段, 略過 {stats['skipped']} 段, 失敗 {stats['failed']} 段")
+    if stats['failed']:
+        print("請以相同參數重新執行，將只重做失敗的部分")
+
+def run_backfill(args):
+    """分段回補期間資料或股票清單"""
+    series_flags = [(args.cpi, 'cpi_us'), (args.nfp, 'nfp_us'), (args.oil, 'oil'), (args.gold, 'gold')]
+    series_market = next((market for flag, market in series_flags if flag), None)
+    try:
+        if series_market:
+            if not (args.start_date and args.end_date):
+                print("回補期間資料需指定 --start_date 與 --end_date")
+                return
+            stats = BackfillService().backfill_series(
+                series_market, args.start_date, args.end_date, args.chunk_days, args.restart
+            )
+        else:
+            market = resolve_market(args)
+            if not args.symbols or market is None:
+                print("回補股票需提供股票代號與市場類型 (例: python main.py 2330 2317 --tw --backfill)")
+                return
+            stats = BackfillService(FundamentalDataService(args.base_currency)).backfill_symbols(
+                args.symbols, market, args.batch_size or DEFAULT_SYMBOL_BATCH_SIZE, args.restart
+            )
+    except Exception as e:
+        print(f"✗ 回補失敗: {str(e)}")
+        return
+    print_backfill_stats(stats)
+
+def show_sector_stats(args):
+    """顯示產業彙總"""
+    market = resolve_market(args)
+    if market is None or not args.sector:
+        print("請指定市場類型與產業板塊 (例: python main.py --us --sector_stats --sector Technology)")
+        return
+    try:
+        aggregate = FundamentalDataService().get_sector_aggregate(market, args.metric, args.sector, args.industry)
+    except Exception as e:
+        print(f"✗ 產業彙總查詢失敗: {str(e)}")
+        return
+    name = f"{args.sector} / {args.industry}" if args.industry else args.sector
+    if aggregate is None:
+        print(f"查無 {name} 的 {args.metric} 彙總資料")
+        return
+    quantiles = aggregate['quantiles']
+    print(f"📊 {name} ({market}) {args.metric}:")
+    print(f"  筆數: {aggregate['count']}")
+    print(f"  平均: {format_number(aggregate['mean'], 'ratio')}")
+    print(f"  第一四分位數: {format_number(quantiles.get(0.25), 'ratio')}")
+    print(f"  中位數: {format_number(quantiles.get(0.5), 'ratio')}")
+    print(f"  第三四分位數: {format_number(quantiles.get(0.75), 'ratio')}")
+
+def rebuild_sector_aggregates(args):
+    """完整重建產業彙總"""
+    market = resolve_market(args)
+    if market is None:
+        print("請指定市場類型 (例: python main.py --us --rebuild_aggregates)")
+        return
+    try:
+        count = FundamentalDataService().rebuild_sector_aggregates(market)
+    except Exception as e:
+        print(f"✗ 產業彙總重建失敗: {str(e)}")
+        return
+    print(f"✓ {market} 產業彙總已重建 ({count} 筆)")
+
 def main():
     parser = argparse.ArgumentParser(description='基本面資料查詢工具')
     parser.add_argument('symbols', nargs='*', help='股票代號列表 (例: 2330 AAPL)')
@@ -100,10 +249,64 @@ def main():
     parser.add_argument('--gold', action='store_true', help='查詢黃金期貨價格')  # 新增黃金查詢
     parser.add_argument('--start_date', type=str, help='查詢起始日期 (yyyy/mm/dd)')
     parser.add_argument('--end_date', type=str, help='查詢結束日期 (yyyy/mm/dd)')
+    parser.add_argument('--output', choices=['jsonl', 'csv', 'arrow'], help='串流輸出格式 (不顯示格式化報表)')
+    parser.add_argument('--output_file', type=str, help='串流輸出檔案路徑 (預設輸出至 stdout)')
+    parser.add_argument('--serve', action='store_true', help='啟動HTTP查詢服務')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST, help='HTTP查詢服務位址')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='HTTP查詢服務埠號')
+    parser.add_argument('--enqueue', action='store_true', help='將股票更新工作排入分散式佇列')
+    parser.add_argument('--worker', action='store_true', help='以worker身分處理佇列中的更新工作')
+    parser.add_argument('--poll', action='store_true', help='worker於佇列清空後持續輪詢')
+    parser.add_argument('--queue_status', action='store_true', help='顯示佇列各狀態工作數量')
+    parser.add_argument('--batch_size', type=int, help=f'worker每次領取的工作數 (預設 {DEFAULT_BATCH_SIZE}) / 回補每批代號數 (預設 {DEFAULT_SYMBOL_BATCH_SIZE})')
+    parser.add_argument('--lease_seconds', type=int, default=DEFAULT_LEASE_SECONDS, help='工作租約秒數')
+    parser.add_argument('--backfill', action='store_true', help='分段回補並記錄檢查點，重新執行時略過已完成的部分')
+    parser.add_argument('--chunk_days', type=positive_int, default=DEFAULT_WINDOW_DAYS, help='回補期間資料時每段的天數')
+    parser.add_argument('--restart', action='store_true', help='清除檢查點並重新回補')
+    parser.add_argument('--sector_stats', action='store_true', help='查詢產業彙總 (搭配 --sector/--industry/--metric 與市場選項)')
+    parser.add_argument('--sector', type=str, help='產業板塊 (例: Technology)')
+    parser.add_argument('--industry', type=str, help='細產業 (例: Semiconductors)')
+    parser.add_argument('--metric', type=str, default='trailingPE', help='彙總指標 (預設 trailingPE)')
+    parser.add_argument('--rebuild_aggregates', action='store_true', help='由股票資料表完整重建產業彙總 (搭配市場選項)')
+    parser.add_argument('--base_currency', type=str, default=DEFAULT_BASE_CURRENCY, help='金額換算的基準幣別 (預設 USD)')
     #parser.add_argument('--help-markets', action='store_true', help='顯示支援的市場類型')
     
     args = parser.parse_args()
 
+    if args.serve:
+        run_server(args.host, args.port)
+        return
+
+    if args.worker:
+        queue_service = RefreshQueueService(FundamentalDataService(args.base_currency))
+        print(f"worker {queue_service.worker_id} 開始處理佇列...")
+        stats = queue_service.run_worker(args.batch_size or DEFAULT_BATCH_SIZE, args.lease_seconds,
+                                         exit_when_idle=not args.poll)
+        print(f"worker 結束: 成功 {stats['done']} 筆, 失敗 {stats['failed']} 筆")
+        return
+
+    if args.queue_status:
+        counts = RefreshQueueService().get_status()
+        for status in ['pending', 'leased', 'done', 'failed']:
+            print(f"  {status}: {counts.get(status, 0)}")
+        return
+
+    if args.backfill:
+        run_backfill(args)
+        return
+
+    if args.sector_stats:
+        show_sector_stats(args)
+        return
+
+    if args.rebuild_aggregates:
+        rebuild_sector_aggregates(args)
+        return
+
+    if args.output:
+        stream_query(args)
+        return
+
     # CPI/NFP/OIL/GOLD 查詢 (優先處理)
     if args.cpi:
         service = FundamentalDataService()
@@ -189,28 +392,17 @@ def main():
         return
     
     # 確定市場類型
-    market = None
-    if args.tw:
-        market = 'tw'
-    elif args.us:
-        market = 'us'
-    elif args.two:
-        market = 'two'
-    elif args.etf:
-        market = 'etf'
-    elif args.index:
-        market = 'index'
-    elif args.crypto:
-        market = 'crypto'
-    elif args.forex:
-        market = 'forex'
-    elif args.futures:
-        market = 'futures'
-    else:
+    market = resolve_market(args)
+    if market is None:
         print("請指定市場類型 (例: --tw, --us, --crypto)")
         return
     
-    service = FundamentalDataService()
+    if args.enqueue:
+        count = RefreshQueueService().enqueue(args.symbols, market)
+        print(f"✓ 已排入 {count} 筆 {market} 更新工作")
+        return
+
+    service = FundamentalDataService(args.base_currency)
     
     for symbol in args.symbols:
         try:
@@ -245,6 +437,16 @@ def show_help():
   --cpi                 CPI（Consumer Price Index, 消費者物價指數）
   --oil                 WTI原油價格
   --gold                黃金期貨價格
+  --output FORMAT       串流輸出 jsonl/csv/arrow (不顯示格式化報表)
+  --output_file PATH    串流輸出檔案 (預設為 stdout)
+  --serve               啟動HTTP查詢服務 (搭配 --host/--port)
+  --enqueue             將股票更新工作排入分散式佇列 (搭配股票代號與市場選項)
+  --worker              處理佇列中的更新工作 (可於多台主機同時執行, --poll 持續輪詢)
+  --queue_status        顯示佇列各狀態工作數量
+  --backfill            分段回補並記錄檢查點 (--chunk_days 每段天數, --restart 重新開始)
+  --sector_stats        查詢產業彙總 (--sector/--industry/--metric)
+  --rebuild_aggregates  由股票資料表完整重建產業彙總
+  --base_currency CUR   市值/現金/負債/營收換算的基準幣別 (預設 USD)
 
 使用範例:
   python main.py --us AAPL # 查詢美股AAPL
@@ -259,6 +461,14 @@ def show_help():
   python main.py --nfp --start_date 2010/01/01 --end_date 2024/06/01 # 查詢NFP指定期間
   python main.py --oil --start_date 2022/01/01 --end_date 2022/12/31 # 查詢石油價格指定期間
   python main.py --gold --start_date 2022/01/01 --end_date 2022/12/31 # 查詢黃金期貨價格指定期間
+  python main.py --cpi --start_date 2008/08/01 --end_date 2025/10/01 --output jsonl # CPI期間資料以JSON Lines串流輸出
+  python main.py AAPL TSLA --us --output csv --output_file us.csv # 美股基本面輸出至CSV檔
+  python main.py --serve --port 8080 # 啟動HTTP查詢服務
+  python main.py 2330 2317 2454 --tw --enqueue # 排入台股更新工作
+  python main.py --worker --batch_size 20 # 處理佇列工作直到清空
+  python main.py --oil --start_date 2000/01/01 --end_date 2024/12/31 --backfill # 分段回補原油價格，中斷後重新執行可續傳
+  python main.py --us --sector_stats --sector Technology --metric priceToBook # 查詢美股科技板塊P/B彙總
+  python main.py --us --rebuild_aggregates # 重建美股產業彙總
 """
     print(help_text, flush=True)
 
@@ -1,5 +1,5 @@
 import yfinance as yf
-from datetime import datetime
+from datetime import datetime, timedelta
 from fredapi import Fred
 import os
 from dotenv import load_dotenv
@@ -23,6 +23,7 @@ class FundamentalDataProvider:
             'industry': info.get('industry'),
             'country': info.get('country'),
             'currency': info.get('currency'),
+            'financialCurrency': info.get('financialCurrency'),
             'exchange': info.get('exchange'),
             
             # 估值指標
@@ -71,90 +72,37 @@ class FundamentalDataProvider:
         }
         return data
 
-    def get_cpi_us(self):
-        """取得美國CPI資料 (消費者物價指數)"""
-        if not self.fred:
-            raise Exception("FRED API Key 未設定")
-        import pandas as pd
-        cpi_series = self.fred.get_series('CPIAUCSL')
-        # 計算年增率與月增率
-        yoy_series = cpi_series.pct_change(periods=12) * 100
-        mom_series = cpi_series.pct_change(periods=1) * 100
-        latest_date = cpi_series.index[-1]
-        latest_value = cpi_series.iloc[-1]
-        yoy = yoy_series.iloc[-1]
-        mom = mom_series.iloc[-1]
-        return {
-            'date': latest_date.strftime("%Y/%m/%d"),
-            'value': float(latest_value),
-            'YoY(%)': float(yoy) if pd.notnull(yoy) else None,
-            'MoM(%)': float(mom) if pd.notnull(mom) else None
-        }
-
-    def get_nfp_us(self):
-        """取得美國NFP資料 (非農就業人口)"""
-        if not self.fred:
-            raise Exception("FRED API Key 未設定")
+    def get_fx_rates(self, tickers):
+        """以單次請求批次取得匯率最新收盤價 (例: TWDUSD=X)，回傳 {ticker: rate}"""
         import pandas as pd
-        nfp_series = self.fred.get_series('PAYEMS')
-        mom_change_series = nfp_series.diff(periods=1)
-        yoy_change_series = nfp_series.diff(periods=12)
-        latest_date = nfp_series.index[-1]
-        latest_value = nfp_series.iloc[-1]
-        mom_change = mom_change_series.iloc[-1]
-        yoy_change = yoy_change_series.iloc[-1]
-        return {
-            'date': latest_date.strftime("%Y/%m/%d"),
-            'value': float(latest_value),
-            'MoM_Change': float(mom_change) if pd.notnull(mom_change) else None,
-            'YoY_Change': float(yoy_change) if pd.notnull(yoy_change) else None
-        }
-
-    def get_cpi_us_range(self, start_date, end_date):
-        """取得美國CPI指定期間資料，並計算年增率與月增率"""
-        if not self.fred:
-            raise Exception("FRED API Key 未設定")
-        import pandas as pd
-        start = datetime.strptime(start_date, "%Y/%m/%d")
-        end = datetime.strptime(end_date, "%Y/%m/%d")
-        cpi_series = self.fred.get_series('CPIAUCSL')
-        yoy_series = cpi_series.pct_change(periods=12) * 100
-        mom_series = cpi_series.pct_change(periods=1) * 100
-        filtered = cpi_series[(cpi_series.index >= start) & (cpi_series.index <= end)]
-        result = []
-        for date, value in filtered.items():
-            yoy = yoy_series.get(date, None)
-            mom = mom_series.get(date, None)
-            result.append({
-                'date': date.strftime("%Y/%m/%d"),
-                'value': float(value),
-                'YoY(%)': float(yoy) if pd.notnull(yoy) else None,
-                'MoM(%)': float(mom) if pd.notnull(mom) else None
-            })
-        return result
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return {}
+        hist = yf.download(tickers, period="5d", progress=False, auto_adjust=False)
+        if hist.empty:
+            return {}
+        close = hist["Close"]
+        if isinstance(close, pd.Series):
+            close = close.to_frame(tickers[0])
+        rates = {}
+        for ticker in tickers:
+            if ticker not in close:
+                continue
+            series = close[ticker].dropna()
+            if not series.empty:
+                rates[ticker] = float(series.iloc[-1])
+        return rates
 
-    def get_nfp_us_range(self, start_date, end_date):
-        """取得美國NFP指定期間資料，並計算月變化量與年變化量"""
+    def get_fred_series_points(self, series_id: str):
+        """取得FRED完整序列，回傳依日期排序的 [(yyyy/mm/dd, value)]，缺值為 None"""
         if not self.fred:
             raise Exception("FRED API Key 未設定")
         import pandas as pd
-        start = datetime.strptime(start_date, "%Y/%m/%d")
-        end = datetime.strptime(end_date, "%Y/%m/%d")
-        nfp_series = self.fred.get_series('PAYEMS')
-        mom_change_series = nfp_series.diff(periods=1)
-        yoy_change_series = nfp_series.diff(periods=12)
-        filtered = nfp_series[(nfp_series.index >= start) & (nfp_series.index <= end)]
-        result = []
-        for date, value in filtered.items():
-            mom_change = mom_change_series.get(date, None)
-            yoy_change = yoy_change_series.get(date, None)
-            result.append({
-                'date': date.strftime("%Y/%m/%d"),
-                'value': float(value),
-                'MoM_Change': float(mom_change) if pd.notnull(mom_change) else None,
-                'YoY_Change': float(yoy_change) if pd.notnull(yoy_change) else None
-            })
-        return result
+        series = self.fred.get_series(series_id)
+        return [
+            (date.strftime("%Y/%m/%d"), float(value) if pd.notnull(value) else None)
+            for date, value in series.items()
+        ]
 
     def get_oil_price(self):
         """取得最新WTI原油價格 (DCOILWTICO)"""
@@ -172,24 +120,25 @@ class FundamentalDataProvider:
             'value': float(latest_value)
         }
 
-    def get_oil_price_range(self, start_date, end_date):
-        """取得WTI原油價格指定期間資料 (DCOILWTICO)"""
+    def iter_oil_price_range(self, start_date, end_date):
+        """逐筆產生WTI原油價格指定期間資料 (DCOILWTICO)"""
         if not self.fred:
             raise Exception("FRED API Key 未設定")
-        import pandas as pd
         start = datetime.strptime(start_date, "%Y/%m/%d")
         end = datetime.strptime(end_date, "%Y/%m/%d")
         oil_series = self.fred.get_series('DCOILWTICO')
         oil_series = oil_series.dropna()
         filtered = oil_series[(oil_series.index >= start) & (oil_series.index <= end)]
-        result = []
         for date, value in filtered.items():
-            result.append({
+            yield {
                 'date': date.strftime("%Y/%m/%d"),
                 'symbol': 'DCOILWTICO',
                 'value': float(value)
-            })
-        return result
+            }
+
+    def get_oil_price_range(self, start_date, end_date):
+        """取得WTI原油價格指定期間資料 (DCOILWTICO)"""
+        return list(self.iter_oil_price_range(start_date, end_date))
 
     def get_gold_price(self):
         """取得最新黃金期貨價格 (GC=F)"""
@@ -208,20 +157,22 @@ class FundamentalDataProvider:
             'value': float(latest_value)
         }
 
-    def get_gold_price_range(self, start_date, end_date):
-        """取得黃金期貨指定期間價格 (GC=F)"""
-        import pandas as pd
+    def iter_gold_price_range(self, start_date, end_date):
+        """逐筆產生黃金期貨指定期間價格 (GC=F)"""
         # 轉換日期格式 yyyy/mm/dd -> yyyy-mm-dd
+        # yfinance 的 end 不含當日，加一天使期間與原油一致包含結束日
         start = datetime.strptime(start_date, "%Y/%m/%d").strftime("%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y/%m/%d").strftime("%Y-%m-%d")
+        end = (datetime.strptime(end_date, "%Y/%m/%d") + timedelta(days=1)).strftime("%Y-%m-%d")
         ticker = yf.Ticker("GC=F")
         hist = ticker.history(start=start, end=end)
         hist = hist.dropna(subset=["Close"])
-        result = []
-        for date, row in hist.iterrows():
-            result.append({
+        for date, close in hist["Close"].items():
+            yield {
                 'date': date.strftime("%Y/%m/%d"),
                 'symbol': 'GC=F',
-                'value': float(row["Close"])
-            })
-        return result
\ No newline at end of file
+                'value': float(close)
+            }
+
+    def get_gold_price_range(self, start_date, end_date):
+        """取得黃金期貨指定期間價格 (GC=F)"""
+        return list(self.iter_gold_price_range(start_date, end_date))
\ No newline at end of file
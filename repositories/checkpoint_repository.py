@@ -0,0 +1,67 @@
+import pyodbc
+from config.database_config import DatabaseConfig
+
+
+class CheckpointRepository:
+    """回補作業檢查點儲存庫類"""
+    TABLE = 'fundamental_backfill_checkpoints'
+
+    def __init__(self):
+        config = DatabaseConfig()
+        self.conn_str = config.get_connection_string()
+        self._table_ready = False
+
+    def _ensure_table(self):
+        if self._table_ready:
+            return
+        table = self.TABLE
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table}' AND xtype='U')
+                CREATE TABLE {table} (
+                    jobId NVARCHAR(100) NOT NULL,
+                    chunkKey NVARCHAR(100) NOT NULL,
+                    status NVARCHAR(20) NOT NULL,
+                    itemCount INT NULL,
+                    lastError NVARCHAR(1000) NULL,
+                    lastUpdate DATETIME DEFAULT GETDATE(),
+                    PRIMARY KEY (jobId, chunkKey)
+                )
+            """)
+            conn.commit()
+        self._table_ready = True
+
+    def get_completed_chunks(self, job_id: str):
+        """回傳此作業已完成的 chunk key 集合"""
+        self._ensure_table()
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT chunkKey FROM {self.TABLE} WHERE jobId=? AND status='done'", job_id)
+            return {row[0] for row in cursor.fetchall()}
+
+    def save_checkpoint(self, job_id: str, chunk_key: str, status: str, item_count=None, error=None):
+        """記錄 chunk 執行結果 (done/failed)"""
+        self._ensure_table()
+        if error is not None:
+            error = error[:1000]
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                MERGE {self.TABLE} WITH (HOLDLOCK) AS t
+                USING (SELECT ? AS jobId, ? AS chunkKey) AS s
+                ON t.jobId = s.jobId AND t.chunkKey = s.chunkKey
+                WHEN MATCHED THEN
+                    UPDATE SET status=?, itemCount=?, lastError=?, lastUpdate=GETDATE()
+                WHEN NOT MATCHED THEN
+                    INSERT (jobId, chunkKey, status, itemCount, lastError) VALUES (s.jobId, s.chunkKey, ?, ?, ?);
+            """, job_id, chunk_key, status, item_count, error, status, item_count, error)
+            conn.commit()
+
+    def clear_job(self, job_id: str):
+        """刪除作業的所有檢查點 (重新執行完整回補)"""
+        self._ensure_table()
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {self.TABLE} WHERE jobId=?", job_id)
+            conn.commit()
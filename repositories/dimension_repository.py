@@ -0,0 +1,127 @@
+import threading
+import pyodbc
+
+# 以維度表儲存的重複字串欄位
+DIMENSION_ATTRS = ('shortName', 'sector', 'industry', 'country', 'currency', 'exchange', 'financialCurrency')
+
+# 行程內共用的快取: {attr: {value: id}}，多個 repository 實例及執行緒共用
+_value_to_id = {attr: {} for attr in DIMENSION_ATTRS}
+_id_to_value = {attr: {} for attr in DIMENSION_ATTRS}
+_cache_lock = threading.Lock()
+
+
+def id_column(attr: str):
+    """維度欄位在股票資料表中對應的整數鍵欄位名稱"""
+    return f'{attr}Id'
+
+
+class DimensionRepository:
+    """維度表儲存庫類 (字串屬性 <-> 整數鍵)"""
+    def __init__(self):
+        self._tables_ready = False
+
+    @staticmethod
+    def table_name(attr: str):
+        return f'fundamental_dim_{attr}'
+
+    def ensure_tables(self, cursor):
+        if self._tables_ready:
+            return
+        for attr in DIMENSION_ATTRS:
+            table = self.table_name(attr)
+            cursor.execute(f"""
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table}' AND xtype='U')
+                CREATE TABLE {table} (
+                    id INT IDENTITY(1,1) PRIMARY KEY,
+                    value NVARCHAR(255) NOT NULL UNIQUE
+                )
+            """)
+        self._tables_ready = True
+
+    def get_id(self, cursor, attr: str, value, pending: dict = None):
+        """
+        取得字串值對應的整數鍵，不存在時新增；value 為 None 時回傳 None
+        新增的整數鍵尚未 commit，先記入 pending {(attr, value): id}，由呼叫端 commit 後以 publish 寫入快取
+        """
+        if value is None:
+            return None
+        cached = _value_to_id[attr].get(value)
+        if cached is not None:
+            return cached
+        if pending is not None and (attr, value) in pending:
+            return pending[(attr, value)]
+
+        table = self.table_name(attr)
+        cursor.execute(f"SELECT id FROM {table} WHERE value=?", value)
+        row = cursor.fetchone()
+        if row is None:
+            try:
+                cursor.execute(f"INSERT INTO {table} (value) OUTPUT inserted.id VALUES (?)", value)
+                row = cursor.fetchone()
+            except pyodbc.IntegrityError:
+                # 其他行程同時新增了相同的值
+                cursor.execute(f"SELECT id FROM {table} WHERE value=?", value)
+                row = cursor.fetchone()
+        dim_id = row[0]
+        if pending is not None:
+            pending[(attr, value)] = dim_id
+        return dim_id
+
+    @staticmethod
+    def publish(pending: dict):
+        """交易 commit 後將 get_id 取得的整數鍵寫入快取 (rollback 時直接丟棄 pending 即可)"""
+        with _cache_lock:
+            for (attr, value), dim_id in pending.items():
+                _value_to_id[attr][value] = dim_id
+                _id_to_value[attr][dim_id] = value
+
+    def find_id(self, cursor, attr: str, value):
+        """查詢字串值對應的整數鍵，不存在時回傳 None (不新增)"""
+        cached = _value_to_id[attr].get(value)
+        if cached is not None:
+            return cached
+        cursor.execute(f"SELECT id FROM {self.table_name(attr)} WHERE value=?", value)
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        with _cache_lock:
+            _value_to_id[attr][value] = row[0]
+            _id_to_value[attr][row[0]] = value
+        return row[0]
+
+    def get_value(self, cursor, attr: str, dim_id):
+        """取得整數鍵對應的字串值"""
+        if dim_id is None:
+            return None
+        cached = _id_to_value[attr].get(dim_id)
+        if cached is not None:
+            return cached
+        cursor.execute(f"SELECT value FROM {self.table_name(attr)} WHERE id=?", dim_id)
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        with _cache_lock:
+            _value_to_id[attr][row[0]] = dim_id
+            _id_to_value[attr][dim_id] = row[0]
+        return row[0]
+
+    def encode(self, cursor, data: dict, pending: dict = None):
+        """將資料中的維度字串欄位換成整數鍵欄位，回傳新的 dict (新增的整數鍵記入 pending)"""
+        encoded = {}
+        for key, value in data.items():
+            if key in DIMENSION_ATTRS:
+                encoded[id_column(key)] = self.get_id(cursor, key, value, pending)
+            else:
+                encoded[key] = value
+        return encoded
+
+    def decode(self, cursor, row: dict):
+        """將整數鍵欄位換回維度字串欄位，回傳新的 dict"""
+        decoded = {}
+        for key, value in row.items():
+            attr = key[:-2] if key.endswith('Id') else None
+            if attr in DIMENSION_ATTRS:
+                decoded[attr] = self.get_value(cursor, attr, value)
+            else:
+                decoded[key] = value
+        return decoded
@@ -1,16 +1,45 @@
+import threading
 import pyodbc
 from config.database_config import DatabaseConfig
+from repositories.dimension_repository import DimensionRepository, DIMENSION_ATTRS, id_column
+from repositories.sector_aggregate_repository import SectorAggregateRepository
+
+# 基準幣別換算欄位 (與原幣別金額欄位並存)
+FX_COLUMNS = (
+    ('marketCapBase', 'FLOAT'),
+    ('totalCashBase', 'FLOAT'),
+    ('totalDebtBase', 'FLOAT'),
+    ('totalRevenueBase', 'FLOAT'),
+    ('baseCurrency', 'NVARCHAR(10)'),
+    ('fxRate', 'FLOAT'),
+    ('financialFxRate', 'FLOAT'),
+)
 
 class FundamentalDataRepository:
     """基本面數據儲存庫類"""
     def __init__(self):
         config = DatabaseConfig()
         self.conn_str = config.get_connection_string()
+        self.dimensions = DimensionRepository()
+        self.aggregates = SectorAggregateRepository()
+        self._ready_tables = set()
+        # 多執行緒共用同一實例時，資料表建立與遷移只由一個執行緒執行
+        self._ensure_lock = threading.Lock()
 
     def _get_table_name(self, market: str):
         return f'fundamental_data_{market}'
 
     def _ensure_table(self, market: str):
+        # 同一實例內每個資料表只檢查一次
+        if market in self._ready_tables:
+            return
+        with self._ensure_lock:
+            if market in self._ready_tables:
+                return
+            self._create_table(market)
+            self._ready_tables.add(market)
+
+    def _create_table(self, market: str):
         table = self._get_table_name(market)
         # CPI/NFP 資料表
         if market == 'cpi_us':
@@ -74,52 +103,136 @@ class FundamentalDataRepository:
 
         with pyodbc.connect(self.conn_str) as conn:
             cursor = conn.cursor()
+            # 跨行程互斥: 同時啟動的 worker 不會重複執行舊版資料表的 ALTER/DROP
+            lock_name = f'{table}_schema'
+            cursor.execute(
+                "DECLARE @result INT; "
+                "EXEC @result = sp_getapplock @Resource=?, @LockMode='Exclusive', @LockOwner='Session', @LockTimeout=60000; "
+                "IF @result < 0 THROW 50000, 'sp_getapplock timeout', 1;",
+                lock_name
+            )
+            try:
+                self._create_stock_table(cursor, market, table)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.execute("EXEC sp_releaseapplock @Resource=?, @LockOwner='Session'", lock_name)
+
+    def _create_stock_table(self, cursor, market: str, table: str):
+        self.dimensions.ensure_tables(cursor)
+        # shortName/sector/industry/country/currency/exchange/financialCurrency 以維度表整數鍵儲存
+        cursor.execute(f"""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table}' AND xtype='U')
+            CREATE TABLE {table} (
+                symbol NVARCHAR(50) PRIMARY KEY,
+                shortNameId INT,
+                sectorId INT,
+                industryId INT,
+                marketCap BIGINT,
+                trailingPE FLOAT,
+                forwardPE FLOAT,
+                priceToBook FLOAT,
+                dividendYield FLOAT,
+                beta FLOAT,
+                countryId INT,
+                currencyId INT,
+                exchangeId INT,
+                financialCurrencyId INT,
+                priceToSales FLOAT,
+                enterpriseToRevenue FLOAT,
+                enterpriseToEbitda FLOAT,
+                pegRatio FLOAT,
+                debtToEquity FLOAT,
+                returnOnEquity FLOAT,
+                returnOnAssets FLOAT,
+                profitMargins FLOAT,
+                operatingMargins FLOAT,
+                grossMargins FLOAT,
+                revenueGrowth FLOAT,
+                earningsGrowth FLOAT,
+                currentRatio FLOAT,
+                quickRatio FLOAT,
+                totalCash BIGINT,
+                totalDebt BIGINT,
+                totalRevenue BIGINT,
+                netIncomeToCommon BIGINT,
+                bookValue FLOAT,
+                sharesOutstanding BIGINT,
+                fiftyTwoWeekHigh FLOAT,
+                fiftyTwoWeekLow FLOAT,
+                averageVolume BIGINT,
+                dividendRate FLOAT,
+                payoutRatio FLOAT,
+                exDividendDate NVARCHAR(20),
+                marketCapBase FLOAT,
+                totalCashBase FLOAT,
+                totalDebtBase FLOAT,
+                totalRevenueBase FLOAT,
+                baseCurrency NVARCHAR(10),
+                fxRate FLOAT,
+                financialFxRate FLOAT,
+                lastUpdate DATETIME DEFAULT GETDATE()
+            )
+        """)
+        cursor.execute("SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME=?", table)
+        existing = {row[0] for row in cursor.fetchall()}
+        self._migrate_dimension_columns(cursor, table, existing)
+        self._add_missing_columns(cursor, table, existing, FX_COLUMNS)
+        # 新建及遷移後的舊版資料表都需要 sector/industry 索引
+        cursor.execute(f"""
+            IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_{table}_sector_industry' AND object_id=OBJECT_ID('{table}'))
+            CREATE INDEX IX_{table}_sector_industry ON {table} (sectorId, industryId)
+        """)
+        self._create_dimension_view(cursor, table)
+        self.aggregates.ensure_table(cursor)
+        # 市場尚未重建過產業彙總時完整重建一次 (並記錄於標記表)，之後隨寫入增量更新
+        if not self.aggregates.is_built(cursor, market):
+            self.aggregates.rebuild(cursor, market, table)
+
+    def _add_missing_columns(self, cursor, table: str, existing, columns):
+        """舊版資料表: 補上新增的欄位"""
+        for name, sql_type in columns:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD {name} {sql_type} NULL")
+
+    def _migrate_dimension_columns(self, cursor, table: str, existing):
+        """舊版資料表: 將字串欄位轉入維度表並改存整數鍵"""
+        for attr in DIMENSION_ATTRS:
+            col = id_column(attr)
+            if col not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD {col} INT NULL")
+            if attr not in existing:
+                continue
+            dim_table = self.dimensions.table_name(attr)
             cursor.execute(f"""
-                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table}' AND xtype='U')
-                CREATE TABLE {table} (
-                    symbol NVARCHAR(50) PRIMARY KEY,
-                    shortName NVARCHAR(255),
-                    sector NVARCHAR(255),
-                    industry NVARCHAR(255),
-                    marketCap BIGINT,
-                    trailingPE FLOAT,
-                    forwardPE FLOAT,
-                    priceToBook FLOAT,
-                    dividendYield FLOAT,
-                    beta FLOAT,
-                    country NVARCHAR(50),
-                    currency NVARCHAR(10),
-                    exchange NVARCHAR(50),
-                    priceToSales FLOAT,
-                    enterpriseToRevenue FLOAT,
-                    enterpriseToEbitda FLOAT,
-                    pegRatio FLOAT,
-                    debtToEquity FLOAT,
-                    returnOnEquity FLOAT,
-                    returnOnAssets FLOAT,
-                    profitMargins FLOAT,
-                    operatingMargins FLOAT,
-                    grossMargins FLOAT,
-                    revenueGrowth FLOAT,
-                    earningsGrowth FLOAT,
-                    currentRatio FLOAT,
-                    quickRatio FLOAT,
-                    totalCash BIGINT,
-                    totalDebt BIGINT,
-                    totalRevenue BIGINT,
-                    netIncomeToCommon BIGINT,
-                    bookValue FLOAT,
-                    sharesOutstanding BIGINT,
-                    fiftyTwoWeekHigh FLOAT,
-                    fiftyTwoWeekLow FLOAT,
-                    averageVolume BIGINT,
-                    dividendRate FLOAT,
-                    payoutRatio FLOAT,
-                    exDividendDate NVARCHAR(20),
-                    lastUpdate DATETIME DEFAULT GETDATE()
-                )
+                INSERT INTO {dim_table} (value)
+                SELECT DISTINCT {attr} FROM {table}
+                WHERE {attr} IS NOT NULL AND {attr} NOT IN (SELECT value FROM {dim_table})
             """)
-            conn.commit()
+            cursor.execute(f"UPDATE t SET {col}=d.id FROM {table} t JOIN {dim_table} d ON d.value=t.{attr}")
+            cursor.execute(f"ALTER TABLE {table} DROP COLUMN {attr}")
+
+    def _create_dimension_view(self, cursor, table: str):
+        """建立 {table}_view，以維度表還原字串欄位供查詢使用"""
+        select_attrs = ', '.join(f"d_{attr}.value AS {attr}" for attr in DIMENSION_ATTRS)
+        joins = ' '.join(
+            f"LEFT JOIN {self.dimensions.table_name(attr)} d_{attr} ON d_{attr}.id = t.{id_column(attr)}"
+            for attr in DIMENSION_ATTRS
+        )
+        cursor.execute(f"CREATE OR ALTER VIEW {table}_view AS SELECT t.*, {select_attrs} FROM {table} t {joins}")
+
+    def get_series_rows(self, market: str, columns):
+        """讀取序列資料表既有資料，回傳 {date: {'value': ..., 欄位: ...}}"""
+        self._ensure_table(market)
+        table = self._get_table_name(market)
+        fields = ['value'] + list(columns)
+        select_clause = ', '.join(f"[{col}]" for col in fields)
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT date, {select_clause} FROM {table}")
+            return {row[0]: dict(zip(fields, row[1:])) for row in cursor.fetchall()}
 
     def save_fundamental_data(self, market: str, data):
         self._ensure_table(market)
@@ -223,30 +336,85 @@ class FundamentalDataRepository:
                     conn.commit()
                 return
             # --- 股票更新區塊 ---
-            symbol = data['symbol']
-            cursor.execute(f"SELECT * FROM {table} WHERE symbol=?", symbol)
+            # 新增的維度整數鍵在 commit 成功後才寫入行程快取，避免 rollback 後快取到不存在的鍵
+            pending_ids = {}
+            encoded = self.dimensions.encode(cursor, data, pending_ids)
+            symbol = encoded['symbol']
+            columns = list(encoded.keys())
+            new_values = [encoded[k] for k in columns]
+            # 加鎖讀取舊資料列: 同一代號的寫入依序進行，避免兩個交易扣除同一筆舊值造成彙總偏移
+            cursor.execute(
+                f"SELECT {','.join(columns)} FROM {table} WITH (UPDLOCK, HOLDLOCK) WHERE symbol=?", symbol
+            )
             row = cursor.fetchone()
             if row:
-                # 檢查是否有變動（只比對主要財務欄位）
-                columns = list(data.keys())
-                db_values = [row[i] for i in range(len(columns))]
-                new_values = [data[k] for k in columns]
-                if db_values != new_values:
-                    # 有變動則更新
+                # 有變動才更新欄位，無變動時只更新 lastUpdate 供查詢判斷資料是否過期
+                if list(row) != new_values:
                     set_clause = ','.join([f"{col}=?" for col in columns])
                     cursor.execute(
                         f"UPDATE {table} SET {set_clause}, lastUpdate=GETDATE() WHERE symbol=?",
                         *new_values, symbol
                     )
-                    conn.commit()
-                return
+                    self.aggregates.apply_change(cursor, market, dict(zip(columns, row)), encoded)
+                else:
+                    cursor.execute(f"UPDATE {table} SET lastUpdate=GETDATE() WHERE symbol=?", symbol)
             else:
                 # INSERT
-                columns = ','.join(data.keys())
-                placeholders = ','.join(['?' for _ in data])
-                values = list(data.values())
+                placeholders = ','.join(['?' for _ in columns])
                 cursor.execute(
-                    f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
-                    *values
+                    f"INSERT INTO {table} ({','.join(columns)}) VALUES ({placeholders})",
+                    *new_values
                 )
-            conn.commit()
\ No newline at end of file
+                self.aggregates.apply_change(cursor, market, None, encoded)
+            conn.commit()
+            self.dimensions.publish(pending_ids)
+
+    def get_fundamental_data(self, market: str, symbol: str, max_age_seconds: int = None):
+        """
+        讀取股票基本面資料 (維度欄位還原為字串)，不存在時回傳 None
+        指定 max_age_seconds 時，最後更新時間超過此秒數的資料視為不存在
+        """
+        self._ensure_table(market)
+        table = self._get_table_name(market)
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            if max_age_seconds is None:
+                cursor.execute(f"SELECT * FROM {table} WHERE symbol=?", symbol)
+            else:
+                cursor.execute(
+                    f"SELECT * FROM {table} WHERE symbol=? AND lastUpdate >= DATEADD(SECOND, -?, GETDATE())",
+                    symbol, int(max_age_seconds)
+                )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            columns = [desc[0] for desc in cursor.description]
+            return self.dimensions.decode(cursor, dict(zip(columns, row)))
+
+    def get_sector_aggregate(self, market: str, metric: str, sector: str, industry: str = None,
+                             quantiles=(0.25, 0.5, 0.75)):
+        """
+        讀取產業彙總 (筆數、平均、分位數)，industry 為 None 時回傳整個 sector
+        查無資料時回傳 None
+        """
+        self._ensure_table(market)
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            sector_id = self.dimensions.find_id(cursor, 'sector', sector)
+            if sector_id is None:
+                return None
+            industry_id = None
+            if industry is not None:
+                industry_id = self.dimensions.find_id(cursor, 'industry', industry)
+                if industry_id is None:
+                    return None
+            return self.aggregates.get_aggregate(cursor, market, sector_id, industry_id, metric, quantiles)
+
+    def rebuild_sector_aggregates(self, market: str):
+        """由股票資料表完整重建產業彙總，回傳彙總筆數"""
+        self._ensure_table(market)
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            count = self.aggregates.rebuild(cursor, market, self._get_table_name(market))
+            conn.commit()
+        return count
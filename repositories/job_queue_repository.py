@@ -0,0 +1,152 @@
+import pyodbc
+from config.database_config import DatabaseConfig
+
+
+class JobQueueRepository:
+    """股票更新工作佇列儲存庫類 (以租約 lease 分派工作給多個 worker)"""
+    TABLE = 'fundamental_refresh_jobs'
+
+    def __init__(self):
+        config = DatabaseConfig()
+        self.conn_str = config.get_connection_string()
+        self._table_ready = False
+
+    def _ensure_table(self):
+        if self._table_ready:
+            return
+        table = self.TABLE
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table}' AND xtype='U')
+                BEGIN
+                    CREATE TABLE {table} (
+                        id BIGINT IDENTITY(1,1) PRIMARY KEY,
+                        symbol NVARCHAR(50) NOT NULL,
+                        market NVARCHAR(20) NOT NULL,
+                        status NVARCHAR(20) NOT NULL DEFAULT 'pending',
+                        leaseOwner NVARCHAR(100) NULL,
+                        leaseExpires DATETIME NULL,
+                        attempts INT NOT NULL DEFAULT 0,
+                        lastError NVARCHAR(1000) NULL,
+                        lastUpdate DATETIME DEFAULT GETDATE(),
+                        CONSTRAINT UQ_{table}_market_symbol UNIQUE (market, symbol)
+                    );
+                    CREATE INDEX IX_{table}_status ON {table} (status, leaseExpires);
+                END
+            """)
+            conn.commit()
+        self._table_ready = True
+
+    def enqueue(self, jobs):
+        """
+        加入 (symbol, market) 工作
+        已存在且尚未完成的工作維持原狀，已完成或失敗的工作重新排入
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return 0
+        self._ensure_table()
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.fast_executemany = True
+            cursor.executemany(f"""
+                MERGE {self.TABLE} WITH (HOLDLOCK) AS t
+                USING (SELECT ? AS symbol, ? AS market) AS s
+                ON t.symbol = s.symbol AND t.market = s.market
+                WHEN MATCHED AND t.status IN ('done', 'failed') THEN
+                    UPDATE SET status='pending', leaseOwner=NULL, leaseExpires=NULL,
+                               attempts=0, lastError=NULL, lastUpdate=GETDATE()
+                WHEN NOT MATCHED THEN
+                    INSERT (symbol, market) VALUES (s.symbol, s.market);
+            """, jobs)
+            conn.commit()
+        return len(jobs)
+
+    def claim(self, worker_id: str, batch_size: int, lease_seconds: int, max_attempts: int):
+        """
+        領取最多 batch_size 筆待處理或租約已過期的工作，回傳 [(id, symbol, market)]
+        READPAST 讓多個 worker 同時領取時略過彼此鎖定的資料列
+        """
+        self._ensure_table()
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                WITH next_jobs AS (
+                    SELECT TOP (?) * FROM {self.TABLE} WITH (UPDLOCK, READPAST, ROWLOCK)
+                    WHERE attempts < ?
+                      AND (status = 'pending' OR (status = 'leased' AND leaseExpires < GETDATE()))
+                    ORDER BY id
+                )
+                UPDATE next_jobs
+                SET status='leased', leaseOwner=?, leaseExpires=DATEADD(second, ?, GETDATE()),
+                    attempts=attempts + 1, lastUpdate=GETDATE()
+                OUTPUT inserted.id, inserted.symbol, inserted.market
+            """, batch_size, max_attempts, worker_id, lease_seconds)
+            rows = [(row[0], row[1], row[2]) for row in cursor.fetchall()]
+            conn.commit()
+        return rows
+
+    def heartbeat(self, worker_id: str, job_ids, lease_seconds: int):
+        """延長此 worker 持有工作的租約，回傳仍持有的筆數"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+        placeholders = ','.join(['?' for _ in job_ids])
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE {self.TABLE} SET leaseExpires=DATEADD(second, ?, GETDATE()) "
+                f"WHERE leaseOwner=? AND status='leased' AND id IN ({placeholders})",
+                lease_seconds, worker_id, *job_ids
+            )
+            count = cursor.rowcount
+            conn.commit()
+        return count
+
+    def complete(self, worker_id: str, job_id: int):
+        """標記工作完成 (僅限仍持有租約的 worker)"""
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE {self.TABLE} SET status='done', leaseOwner=NULL, leaseExpires=NULL, "
+                f"lastError=NULL, lastUpdate=GETDATE() WHERE id=? AND leaseOwner=? AND status='leased'",
+                job_id, worker_id
+            )
+            conn.commit()
+
+    def fail(self, worker_id: str, job_id: int, error: str, max_attempts: int):
+        """標記工作失敗，未達最大嘗試次數時重新排入"""
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE {self.TABLE} SET "
+                f"status=CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                f"leaseOwner=NULL, leaseExpires=NULL, lastError=?, lastUpdate=GETDATE() "
+                f"WHERE id=? AND leaseOwner=? AND status='leased'",
+                max_attempts, error[:1000], job_id, worker_id
+            )
+            conn.commit()
+
+    def fail_exhausted(self, max_attempts: int):
+        """將租約過期且已達最大嘗試次數的工作標記為失敗"""
+        self._ensure_table()
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE {self.TABLE} SET status='failed', leaseOwner=NULL, leaseExpires=NULL, "
+                f"lastError=COALESCE(lastError, 'lease expired'), lastUpdate=GETDATE() "
+                f"WHERE status='leased' AND leaseExpires < GETDATE() AND attempts >= ?",
+                max_attempts
+            )
+            count = cursor.rowcount
+            conn.commit()
+        return count
+
+    def get_status_counts(self):
+        """回傳各狀態的工作數量"""
+        self._ensure_table()
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT status, COUNT(*) FROM {self.TABLE} GROUP BY status")
+            return {row[0]: row[1] for row in cursor.fetchall()}
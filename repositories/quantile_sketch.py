@@ -0,0 +1,84 @@
+import json
+import math
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+
+class QuantileSketch:
+    """
+    對數分桶分位數估計 (DDSketch 形式)
+    分位數的相對誤差不超過 relative_accuracy，且支援刪除數值，可隨資料列更新增量維護
+    """
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.positive.values()) + sum(self.negative.values())
+
+    def _key(self, value: float):
+        return math.ceil(math.log(abs(value)) / self._log_gamma)
+
+    def _bucket_value(self, key: int):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float, weight: int = 1):
+        """加入數值，weight 為負數時表示刪除"""
+        if value == 0:
+            self.zero_count = max(self.zero_count + weight, 0)
+            return
+        store = self.positive if value > 0 else self.negative
+        key = self._key(value)
+        remaining = store.get(key, 0) + weight
+        if remaining > 0:
+            store[key] = remaining
+        else:
+            store.pop(key, None)
+
+    def remove(self, value: float):
+        self.add(value, -1)
+
+    def quantile(self, q: float):
+        """取得分位數 (0 <= q <= 1)，無資料時回傳 None"""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        # 由小到大: 負數 (絕對值由大到小)、零、正數
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._bucket_value(key)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._bucket_value(key)
+        return self._bucket_value(max(self.positive)) if self.positive else 0.0
+
+    def to_json(self):
+        return json.dumps({
+            'a': self.relative_accuracy,
+            'p': self.positive,
+            'n': self.negative,
+            'z': self.zero_count,
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text):
+        if not text:
+            return cls()
+        raw = json.loads(text)
+        sketch = cls(raw.get('a', DEFAULT_RELATIVE_ACCURACY))
+        sketch.positive = {int(k): v for k, v in raw.get('p', {}).items()}
+        sketch.negative = {int(k): v for k, v in raw.get('n', {}).items()}
+        sketch.zero_count = raw.get('z', 0)
+        return sketch
@@ -0,0 +1,192 @@
+import math
+from collections import defaultdict
+
+from repositories.quantile_sketch import QuantileSketch
+
+# 維護產業彙總的指標欄位
+AGGREGATE_METRICS = (
+    'trailingPE',
+    'forwardPE',
+    'priceToBook',
+    'priceToSales',
+    'returnOnEquity',
+    'returnOnAssets',
+    'profitMargins',
+    'operatingMargins',
+    'grossMargins',
+)
+
+# industryId 為此值時代表整個 sector 的彙總
+ALL_INDUSTRIES = 0
+
+
+def _is_valid(value):
+    return value is not None and not (isinstance(value, float) and (math.isnan(value) or math.isinf(value)))
+
+
+def _contributions(row):
+    """回傳一筆股票資料對彙總的貢獻 [((sectorId, industryId, metric), value)]"""
+    if not row or row.get('sectorId') is None:
+        return []
+    industries = [ALL_INDUSTRIES]
+    if row.get('industryId') is not None:
+        industries.append(row['industryId'])
+    result = []
+    for metric in AGGREGATE_METRICS:
+        value = row.get(metric)
+        if not _is_valid(value):
+            continue
+        for industry_id in industries:
+            result.append(((row['sectorId'], industry_id, metric), float(value)))
+    return result
+
+
+class SectorAggregateRepository:
+    """
+    產業彙總儲存庫類
+    依 (market, sector, industry, metric) 維護筆數、總和與分位數 sketch，
+    隨股票資料寫入增量更新，查詢時只需讀取單一資料列
+    """
+    TABLE = 'fundamental_sector_aggregates'
+    # 已完成初次重建的市場 (市場無任何彙總列時也需記錄，避免每次啟動重掃股票資料表)
+    MARKETS_TABLE = 'fundamental_sector_aggregate_markets'
+
+    def __init__(self):
+        self._table_ready = False
+
+    def ensure_table(self, cursor):
+        if self._table_ready:
+            return
+        table = self.TABLE
+        cursor.execute(f"""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table}' AND xtype='U')
+            CREATE TABLE {table} (
+                market NVARCHAR(20) NOT NULL,
+                sectorId INT NOT NULL,
+                industryId INT NOT NULL,
+                metric NVARCHAR(50) NOT NULL,
+                valueCount INT NOT NULL,
+                valueSum FLOAT NOT NULL,
+                sketch NVARCHAR(MAX),
+                lastUpdate DATETIME DEFAULT GETDATE(),
+                PRIMARY KEY (market, sectorId, industryId, metric)
+            )
+        """)
+        markets_table = self.MARKETS_TABLE
+        cursor.execute(f"""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{markets_table}' AND xtype='U')
+            CREATE TABLE {markets_table} (
+                market NVARCHAR(20) PRIMARY KEY,
+                lastRebuild DATETIME DEFAULT GETDATE()
+            )
+        """)
+        self._table_ready = True
+
+    def apply_change(self, cursor, market: str, old_row, new_row):
+        """
+        依股票資料列的變動 (old_row -> new_row，新增時 old_row 為 None) 增量更新彙總
+        需與資料列寫入在同一交易內呼叫
+        """
+        deltas = defaultdict(lambda: defaultdict(int))
+        for key, value in _contributions(old_row):
+            deltas[key][value] -= 1
+        for key, value in _contributions(new_row):
+            deltas[key][value] += 1
+
+        for key, changes in deltas.items():
+            changes = {value: weight for value, weight in changes.items() if weight}
+            if changes:
+                self._update_aggregate(cursor, market, key, changes)
+
+    def _update_aggregate(self, cursor, market: str, key, changes):
+        sector_id, industry_id, metric = key
+        cursor.execute(
+            f"SELECT valueCount, valueSum, sketch FROM {self.TABLE} WITH (UPDLOCK, HOLDLOCK) "
+            f"WHERE market=? AND sectorId=? AND industryId=? AND metric=?",
+            market, sector_id, industry_id, metric
+        )
+        row = cursor.fetchone()
+        count, total, sketch = (row[0], row[1], QuantileSketch.from_json(row[2])) if row else (0, 0.0, QuantileSketch())
+        for value, weight in changes.items():
+            sketch.add(value, weight)
+            count += weight
+            total += value * weight
+        count = max(count, 0)
+        if count == 0:
+            total = 0.0
+        if row:
+            cursor.execute(
+                f"UPDATE {self.TABLE} SET valueCount=?, valueSum=?, sketch=?, lastUpdate=GETDATE() "
+                f"WHERE market=? AND sectorId=? AND industryId=? AND metric=?",
+                count, total, sketch.to_json(), market, sector_id, industry_id, metric
+            )
+        else:
+            cursor.execute(
+                f"INSERT INTO {self.TABLE} (market, sectorId, industryId, metric, valueCount, valueSum, sketch) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+                market, sector_id, industry_id, metric, count, total, sketch.to_json()
+            )
+
+    def is_built(self, cursor, market: str):
+        """市場是否已完成初次重建；加鎖讀取，讓同時啟動的行程只有一個執行重建"""
+        cursor.execute(
+            f"SELECT 1 FROM {self.MARKETS_TABLE} WITH (UPDLOCK, HOLDLOCK) WHERE market=?", market
+        )
+        return cursor.fetchone() is not None
+
+    def rebuild(self, cursor, market: str, table: str):
+        """由股票資料表完整重建某市場的彙總 (初次建立或資料修復時使用)"""
+        columns = ['sectorId', 'industryId'] + list(AGGREGATE_METRICS)
+        cursor.execute(f"SELECT {','.join(columns)} FROM {table}")
+        aggregates = defaultdict(lambda: [0, 0.0, QuantileSketch()])
+        for row in cursor.fetchall():
+            for key, value in _contributions(dict(zip(columns, row))):
+                aggregate = aggregates[key]
+                aggregate[0] += 1
+                aggregate[1] += value
+                aggregate[2].add(value)
+        cursor.execute(f"DELETE FROM {self.TABLE} WHERE market=?", market)
+        rows = [
+            (market, sector_id, industry_id, metric, count, total, sketch.to_json())
+            for (sector_id, industry_id, metric), (count, total, sketch) in aggregates.items()
+        ]
+        if rows:
+            cursor.fast_executemany = True
+            cursor.executemany(
+                f"INSERT INTO {self.TABLE} (market, sectorId, industryId, metric, valueCount, valueSum, sketch) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        cursor.execute(f"""
+            MERGE {self.MARKETS_TABLE} WITH (HOLDLOCK) AS t
+            USING (SELECT ? AS market) AS s
+            ON t.market = s.market
+            WHEN MATCHED THEN
+                UPDATE SET lastRebuild=GETDATE()
+            WHEN NOT MATCHED THEN
+                INSERT (market) VALUES (s.market);
+        """, market)
+        return len(rows)
+
+    def get_aggregate(self, cursor, market: str, sector_id: int, industry_id, metric: str,
+                      quantiles=(0.25, 0.5, 0.75)):
+        """
+        讀取彙總，industry_id 為 None 時回傳整個 sector
+        回傳 {'count', 'mean', 'quantiles': {q: value}}，無資料時回傳 None
+        """
+        if metric not in AGGREGATE_METRICS:
+            raise ValueError(f"不支援的彙總指標: {metric}")
+        cursor.execute(
+            f"SELECT valueCount, valueSum, sketch FROM {self.TABLE} "
+            f"WHERE market=? AND sectorId=? AND industryId=? AND metric=?",
+            market, sector_id, ALL_INDUSTRIES if industry_id is None else industry_id, metric
+        )
+        row = cursor.fetchone()
+        if row is None or row[0] == 0:
+            return None
+        sketch = QuantileSketch.from_json(row[2])
+        return {
+            'count': row[0],
+            'mean': row[1] / row[0],
+            'quantiles': {q: sketch.quantile(q) for q in quantiles},
+        }
@@ -0,0 +1,130 @@
+import hashlib
+from datetime import datetime, timedelta
+
+from repositories.checkpoint_repository import CheckpointRepository
+
+# 期間資料每個 chunk 涵蓋的天數
+DEFAULT_WINDOW_DAYS = 365
+# 股票清單每個 chunk 的代號數量
+DEFAULT_SYMBOL_BATCH_SIZE = 50
+
+SERIES_MARKETS = ('cpi_us', 'nfp_us', 'oil', 'gold')
+
+
+def split_date_windows(start_date: str, end_date: str, window_days: int = DEFAULT_WINDOW_DAYS):
+    """將 yyyy/mm/dd 期間切成不重疊的日期區間 [(start, end)]"""
+    if window_days < 1:
+        raise ValueError("每段天數須至少為 1")
+    start = datetime.strptime(start_date, "%Y/%m/%d")
+    end = datetime.strptime(end_date, "%Y/%m/%d")
+    if start > end:
+        raise ValueError("起始日期不可晚於結束日期")
+    windows = []
+    while start <= end:
+        window_end = min(start + timedelta(days=window_days - 1), end)
+        windows.append((start.strftime("%Y/%m/%d"), window_end.strftime("%Y/%m/%d")))
+        start = window_end + timedelta(days=1)
+    return windows
+
+
+class BackfillService:
+    """
+    可續傳的回補服務類
+    將回補切成多個 chunk (期間資料依日期區間、股票依代號批次)，每個 chunk 完成後記錄檢查點；
+    以相同參數重新執行時會略過已完成的 chunk，只重做失敗或未執行的部分
+    """
+    def __init__(self, service=None, checkpoint_repository=None):
+        if service is None:
+            from services.fundamental_data_service import FundamentalDataService
+            service = FundamentalDataService()
+        self.service = service
+        self.checkpoints = checkpoint_repository or CheckpointRepository()
+
+    def _run_chunks(self, job_id: str, chunks):
+        """
+        依序執行 chunks [(chunk_key, func)]，func 回傳處理筆數
+        回傳 {'job_id', 'done', 'skipped', 'failed'}
+        """
+        completed = self.checkpoints.get_completed_chunks(job_id)
+        stats = {'job_id': job_id, 'done': 0, 'skipped': 0, 'failed': 0}
+        for chunk_key, func in chunks:
+            if chunk_key in completed:
+                stats['skipped'] += 1
+                continue
+            try:
+                count = func()
+            except Exception as e:
+                self.checkpoints.save_checkpoint(job_id, chunk_key, 'failed', error=str(e))
+                stats['failed'] += 1
+                print(f"✗ [{job_id}] {chunk_key} 失敗: {str(e)}")
+                continue
+            self.checkpoints.save_checkpoint(job_id, chunk_key, 'done', item_count=count)
+            stats['done'] += 1
+            print(f"✓ [{job_id}] {chunk_key} 完成 ({count} 筆)")
+        return stats
+
+    def backfill_series(self, market: str, start_date: str, end_date: str,
+                        window_days: int = DEFAULT_WINDOW_DAYS, restart: bool = False):
+        """依日期區間回補期間資料 (cpi_us/nfp_us/oil/gold)"""
+        if market not in SERIES_MARKETS:
+            raise ValueError(f"不支援的期間資料類型: {market}")
+        windows = split_date_windows(start_date, end_date, window_days)
+        job_id = f"{market}:{windows[0][0]}-{windows[-1][1]}:{window_days}d"
+        if restart:
+            self.checkpoints.clear_job(job_id)
+
+        # 整段資料只在第一個待執行的 chunk 下載一次，各 chunk 只寫入自己的日期區間
+        loaded = {}
+
+        def load_rows():
+            if 'error' in loaded:
+                raise loaded['error']
+            if 'rows' not in loaded:
+                try:
+                    loaded['rows'] = self.service.collect_range_rows(market, start_date, end_date)
+                except Exception as e:
+                    loaded['error'] = e
+                    raise
+            return loaded['rows']
+
+        def make_chunk(window_start, window_end, is_first, is_last):
+            def in_window(date):
+                # 期間外需更新的既有資料 (例如 CPI 修正影響的衍生欄位) 歸入第一段或最後一段
+                return ((is_first or date >= window_start) and (is_last or date <= window_end))
+
+            def run():
+                rows = [(item, in_range) for item, in_range, to_save in load_rows()
+                        if to_save and in_window(item['date'])]
+                self.service.save_range_rows(market, [item for item, _ in rows])
+                return sum(1 for item, in_range in rows if in_range)
+            return run
+
+        chunks = [
+            (f"{s}-{e}", make_chunk(s, e, i == 0, i == len(windows) - 1))
+            for i, (s, e) in enumerate(windows)
+        ]
+        return self._run_chunks(job_id, chunks)
+
+    def backfill_symbols(self, symbols, market: str,
+                         batch_size: int = DEFAULT_SYMBOL_BATCH_SIZE, restart: bool = False):
+        """依代號批次回補股票基本面，批次內任一代號失敗即視為該批次失敗"""
+        # 排序後切批次，確保相同代號清單每次產生相同的 chunk
+        symbols = sorted(set(symbols))
+        digest = hashlib.sha1(','.join(symbols).encode('utf-8')).hexdigest()[:12]
+        job_id = f"{market}:{digest}:{batch_size}"
+        if restart:
+            self.checkpoints.clear_job(job_id)
+
+        def make_chunk(batch):
+            def run():
+                results, errors = self.service.fetch_and_store_many(batch, market)
+                if errors:
+                    raise Exception('; '.join(f"{symbol}: {error}" for symbol, error in errors.items()))
+                return len(results)
+            return run
+
+        chunks = []
+        for i in range(0, len(symbols), batch_size):
+            batch = symbols[i:i + batch_size]
+            chunks.append((f"{i // batch_size:05d}:{batch[0]}", make_chunk(batch)))
+        return self._run_chunks(job_id, chunks)
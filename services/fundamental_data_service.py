@@ -1,11 +1,27 @@
+from datetime import datetime
 from providers.fundamental_data_provider import FundamentalDataProvider
 from repositories.fundamental_data_repository import FundamentalDataRepository
+from services.incremental_metrics import DERIVED_METRICS, iter_derived_rows
+from services.fx_normalization_service import FxNormalizationService, DEFAULT_BASE_CURRENCY
+
+# 具衍生欄位 (YoY/MoM) 的FRED序列
+DERIVED_SERIES_IDS = {
+    'cpi_us': 'CPIAUCSL',
+    'nfp_us': 'PAYEMS',
+}
+
+# 期間資料串流時，每累積多少筆寫入資料庫一次
+SAVE_BATCH_SIZE = 500
 
 class FundamentalDataService:
     """基本面數據服務類"""
-    def __init__(self):
+    def __init__(self, base_currency: str = DEFAULT_BASE_CURRENCY):
         self.provider = FundamentalDataProvider()
         self.repository = FundamentalDataRepository()
+        # 匯率快取與服務實例同生命週期，同一次執行中每個幣別只查詢一次
+        self.fx = FxNormalizationService(
+            self.provider, lambda pair: self._get_ticker_with_suffix(pair, 'forex'), base_currency
+        )
 
     def _get_ticker_with_suffix(self, ticker: str, market: str):
         suffix_map = {
@@ -26,32 +42,144 @@ class FundamentalDataService:
     def fetch_and_store(self, ticker: str, market: str):
         ticker_with_suffix = self._get_ticker_with_suffix(ticker, market)
         data = self.provider.get_fundamental_data(ticker_with_suffix)
+        self.fx.normalize([data])
         self.repository.save_fundamental_data(market, data)
         return data
 
+    def get_or_fetch_and_store(self, ticker: str, market: str, max_age: int):
+        """優先讀取資料庫中 max_age 秒內更新過的資料，不存在或已過期時才向 yfinance 取得並儲存"""
+        ticker_with_suffix = self._get_ticker_with_suffix(ticker, market)
+        stored = self.repository.get_fundamental_data(market, ticker_with_suffix, max_age)
+        if stored is not None:
+            stored.pop('lastUpdate', None)
+            return stored
+        return self.fetch_and_store(ticker, market)
+
+    def fetch_and_store_many(self, tickers, market: str):
+        """
+        批次取得並儲存多支股票，所需匯率一次取得後向量化換算
+        回傳 (results, errors)，皆以代號為 key
+        """
+        fetched = {}
+        errors = {}
+        for ticker in dict.fromkeys(tickers):
+            try:
+                fetched[ticker] = self.provider.get_fundamental_data(self._get_ticker_with_suffix(ticker, market))
+            except Exception as e:
+                errors[ticker] = str(e)
+        self.fx.normalize(list(fetched.values()))
+        results = {}
+        for ticker, data in fetched.items():
+            try:
+                self.repository.save_fundamental_data(market, data)
+                results[ticker] = data
+            except Exception as e:
+                errors[ticker] = str(e)
+        return results, errors
+
+    def get_sector_aggregate(self, market: str, metric: str, sector: str, industry: str = None):
+        """取得產業彙總 (筆數、平均、四分位數)"""
+        return self.repository.get_sector_aggregate(market, metric, sector, industry)
+
+    def rebuild_sector_aggregates(self, market: str):
+        """由股票資料表完整重建產業彙總 (資料修復用)，回傳彙總筆數"""
+        return self.repository.rebuild_sector_aggregates(market)
+
+    def get_sector_relative(self, market: str, data: dict, metric: str):
+        """回傳股票指標相對其產業中位數的倍數，無法計算時回傳 None"""
+        value = data.get(metric)
+        if value is None or not data.get('sector'):
+            return None
+        aggregate = self.get_sector_aggregate(market, metric, data['sector'], data.get('industry'))
+        median = aggregate['quantiles'].get(0.5) if aggregate else None
+        if not median:
+            return None
+        return value / median
+
+    def _iter_derived(self, market: str, start_date=None, end_date=None):
+        """
+        取得FRED序列並增量計算衍生欄位
+        只重算新觀測值及被修正日期之後受影響的區段，其餘沿用資料庫既有數值
+        start_date/end_date 皆為 None 時只產生最新一筆
+        """
+        points = self.provider.get_fred_series_points(DERIVED_SERIES_IDS[market])
+        observed = [date for date, value in points if value is not None]
+        if not observed:
+            raise Exception(f"無法取得 {DERIVED_SERIES_IDS[market]} 序列資料")
+        columns = [name for name, _, _ in DERIVED_METRICS[market]]
+        stored_rows = self.repository.get_series_rows(market, columns)
+        if start_date is None and end_date is None:
+            start = end = observed[-1]
+        else:
+            start = datetime.strptime(start_date, "%Y/%m/%d").strftime("%Y/%m/%d")
+            end = datetime.strptime(end_date, "%Y/%m/%d").strftime("%Y/%m/%d")
+        return iter_derived_rows(market, points, stored_rows, start, end)
+
+    def _iter_range_rows(self, market: str, start_date=None, end_date=None):
+        """產生期間資料 (item, in_range, to_save)，資料來源只下載一次"""
+        if market in DERIVED_SERIES_IDS:
+            return self._iter_derived(market, start_date, end_date)
+        if market == 'oil':
+            return ((item, True, True) for item in self.provider.iter_oil_price_range(start_date, end_date))
+        if market == 'gold':
+            return ((item, True, True) for item in self.provider.iter_gold_price_range(start_date, end_date))
+        raise Exception(f"不支援的期間資料類型: {market}")
+
+    def collect_range_rows(self, market: str, start_date, end_date):
+        """一次取得整段期間資料 (不寫入資料庫)，回傳 [(item, in_range, to_save)] 供分段寫入"""
+        return list(self._iter_range_rows(market, start_date, end_date))
+
+    def save_range_rows(self, market: str, items):
+        """寫入 collect_range_rows 取得的資料列"""
+        if items:
+            self.repository.save_fundamental_data(market, items)
+
+    def iter_fetch_and_store_range(self, market: str, start_date=None, end_date=None,
+                                   batch_size: int = SAVE_BATCH_SIZE):
+        """
+        逐筆產生期間資料 (cpi_us/nfp_us/oil/gold)，並每 batch_size 筆分批儲存
+        cpi_us/nfp_us 的 start_date/end_date 皆為 None 時只產生最新一筆
+        """
+        rows = self._iter_range_rows(market, start_date, end_date)
+
+        pending = []
+        try:
+            for item, in_range, to_save in rows:
+                if to_save:
+                    pending.append(item)
+                    if len(pending) >= batch_size:
+                        batch, pending = pending, []
+                        self.repository.save_fundamental_data(market, batch)
+                if in_range:
+                    yield item
+        finally:
+            # 中途發生錯誤或呼叫端提前關閉時，仍寫入已累積的資料
+            if pending:
+                self.repository.save_fundamental_data(market, pending)
+
+    def iter_fetch_and_store(self, symbols, market: str):
+        """逐一處理股票代號，產生 (symbol, data, error)，失敗時 data 為 None"""
+        for symbol in symbols:
+            try:
+                yield symbol, self.fetch_and_store(symbol, market), None
+            except Exception as e:
+                yield symbol, None, e
+
     def fetch_and_store_cpi_us(self):
         """取得並儲存美國CPI資料"""
-        data = self.provider.get_cpi_us()
-        self.repository.save_fundamental_data('cpi_us', data)
-        return data
+        return list(self.iter_fetch_and_store_range('cpi_us'))[-1]
 
     def fetch_and_store_nfp_us(self):
         """取得並儲存美國NFP資料"""
-        data = self.provider.get_nfp_us()
-        self.repository.save_fundamental_data('nfp_us', data)
-        return data
+        return list(self.iter_fetch_and_store_range('nfp_us'))[-1]
 
     def fetch_and_store_cpi_us_range(self, start_date, end_date):
         """取得並儲存美國CPI指定期間資料"""
-        data_list = self.provider.get_cpi_us_range(start_date, end_date)
-        self.repository.save_fundamental_data('cpi_us', data_list)
-        return data_list
+        return list(self.iter_fetch_and_store_range('cpi_us', start_date, end_date))
 
     def fetch_and_store_nfp_us_range(self, start_date, end_date):
         """取得並儲存美國NFP指定期間資料"""
-        data_list = self.provider.get_nfp_us_range(start_date, end_date)
-        self.repository.save_fundamental_data('nfp_us', data_list)
-        return data_list
+        return list(self.iter_fetch_and_store_range('nfp_us', start_date, end_date))
 
     def fetch_and_store_oil_price(self):
         """取得並儲存最新WTI原油價格"""
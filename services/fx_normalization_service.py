@@ -0,0 +1,118 @@
+import sys
+import time
+
+import pandas as pd
+
+DEFAULT_BASE_CURRENCY = 'USD'
+
+# 匯率快取有效秒數，長時間執行的服務 (--serve、--worker --poll) 逾時後重新取得
+DEFAULT_RATE_TTL = 3600
+# 取不到匯率的幣別在此秒數內不重複查詢，之後再重試
+FAILED_RATE_RETRY = 300
+
+# 以報價幣別 (currency) 計價、需換算為基準幣別的金額欄位
+QUOTE_MONETARY_COLUMNS = ('marketCap',)
+# 財報金額以財報幣別 (financialCurrency) 計價，例: 台積電 ADR 報價為 USD、財報為 TWD
+FINANCIAL_MONETARY_COLUMNS = ('totalCash', 'totalDebt', 'totalRevenue')
+MONETARY_COLUMNS = QUOTE_MONETARY_COLUMNS + FINANCIAL_MONETARY_COLUMNS
+
+# yfinance 以輔幣報價的幣別: 輔幣 -> 主幣
+# 只有每股價格以輔幣計價，市值與財報金額皆為主幣金額，直接以主幣匯率換算
+MINOR_CURRENCIES = {
+    'GBp': 'GBP',
+    'ZAc': 'ZAR',
+    'ILA': 'ILS',
+}
+
+
+def base_column(column: str):
+    """金額欄位換算為基準幣別後的欄位名稱"""
+    return f'{column}Base'
+
+
+class FxNormalizationService:
+    """
+    匯率正規化服務類
+    每個幣別的匯率批次取得並快取 rate_ttl 秒，金額欄位以 pandas 向量化換算為基準幣別，
+    換算結果 (xxxBase、baseCurrency、fxRate、financialFxRate) 與原幣別欄位並存
+    """
+    def __init__(self, provider, ticker_resolver, base_currency: str = DEFAULT_BASE_CURRENCY,
+                 rate_ttl: float = DEFAULT_RATE_TTL):
+        self.provider = provider
+        # 將幣別對 (例: TWDUSD) 轉為 yfinance 外匯代號 (例: TWDUSD=X)
+        self.ticker_resolver = ticker_resolver
+        self.base_currency = base_currency
+        self.rate_ttl = rate_ttl
+        # {主幣: (匯率, 取得時間)}，取得時間為 time.monotonic()
+        self.rates = {}
+        # {主幣: 最近一次取得失敗的時間}
+        self.failures = {}
+
+    @staticmethod
+    def _major(currency: str):
+        return MINOR_CURRENCIES.get(currency, currency)
+
+    def _cached_rate(self, major: str, now: float):
+        if major == self.base_currency:
+            return 1.0
+        cached = self.rates.get(major)
+        if cached is not None and now - cached[1] < self.rate_ttl:
+            return cached[0]
+        return None
+
+    def prefetch(self, currencies):
+        """批次取得未快取或已過期的匯率；取不到的幣別不快取，FAILED_RATE_RETRY 秒後再重試"""
+        now = time.monotonic()
+        majors = {self._major(c) for c in currencies if c}
+        missing = [
+            c for c in majors
+            if self._cached_rate(c, now) is None and now - self.failures.get(c, float('-inf')) >= FAILED_RATE_RETRY
+        ]
+        if not missing:
+            return
+        tickers = {c: self.ticker_resolver(f"{c}{self.base_currency}") for c in missing}
+        try:
+            fetched = self.provider.get_fx_rates(tickers.values())
+        except Exception as e:
+            print(f"無法取得匯率 {', '.join(tickers.values())}: {str(e)}", file=sys.stderr)
+            fetched = {}
+        for currency, ticker in tickers.items():
+            rate = fetched.get(ticker)
+            if rate is None:
+                self.failures[currency] = now
+            else:
+                self.rates[currency] = (rate, now)
+                self.failures.pop(currency, None)
+
+    def get_rate(self, currency):
+        """取得換算為基準幣別的匯率 (輔幣以主幣匯率計)，無法取得時回傳 None"""
+        if not currency:
+            return None
+        self.prefetch([currency])
+        return self._cached_rate(self._major(currency), time.monotonic())
+
+    def normalize(self, records):
+        """為每筆股票資料加入基準幣別金額欄位 (就地修改並回傳 records)"""
+        if not records:
+            return records
+        df = pd.DataFrame(records, columns=['currency', 'financialCurrency', *MONETARY_COLUMNS])
+        # 未提供財報幣別時視同報價幣別
+        df['financialCurrency'] = df['financialCurrency'].fillna(df['currency'])
+        currencies = pd.concat([df['currency'], df['financialCurrency']]).dropna().unique()
+        self.prefetch(currencies)
+        rate_map = {c: self.get_rate(c) for c in currencies}
+        quote_rates = pd.to_numeric(df['currency'].map(rate_map), errors='coerce')
+        financial_rates = pd.to_numeric(df['financialCurrency'].map(rate_map), errors='coerce')
+
+        converted = pd.DataFrame({'fxRate': quote_rates, 'financialFxRate': financial_rates})
+        for column in QUOTE_MONETARY_COLUMNS:
+            converted[base_column(column)] = pd.to_numeric(df[column], errors='coerce') * quote_rates
+        for column in FINANCIAL_MONETARY_COLUMNS:
+            converted[base_column(column)] = pd.to_numeric(df[column], errors='coerce') * financial_rates
+        converted = converted.astype(object).where(converted.notnull(), None)
+
+        for record, values in zip(records, converted.to_dict('records')):
+            record.update(values)
+            has_rate = values['fxRate'] is not None or values['financialFxRate'] is not None
+            record['baseCurrency'] = self.base_currency if has_rate else None
+        return records
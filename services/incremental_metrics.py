@@ -0,0 +1,68 @@
+"""序列衍生指標 (YoY/MoM) 增量計算"""
+
+# 各序列的衍生欄位: (欄位名稱, 回看期數, 計算方式)
+DERIVED_METRICS = {
+    'cpi_us': (
+        ('YoY(%)', 12, 'pct'),
+        ('MoM(%)', 1, 'pct'),
+    ),
+    'nfp_us': (
+        ('MoM_Change', 1, 'diff'),
+        ('YoY_Change', 12, 'diff'),
+    ),
+}
+
+
+def _derive(method, value, prev):
+    if value is None or prev is None:
+        return None
+    if method == 'pct':
+        # 與 pandas pct_change(periods) * 100 相同
+        if prev == 0:
+            return None
+        return (value / prev - 1) * 100
+    return value - prev
+
+
+def iter_derived_rows(market, points, stored_rows, start=None, end=None):
+    """
+    依完整序列與資料庫既有資料，只重算需要更新的日期
+
+    points: 依日期排序的 [(date, value)]，date 格式為 yyyy/mm/dd，缺值為 None
+    stored_rows: {date: {'value': ..., 欄位名稱: ...}}，資料庫既有資料
+    依日期順序產生 (item, in_range, is_dirty):
+      in_range - 該筆位於 start ~ end 期間
+      is_dirty - 該筆為新資料或受修正影響，需寫回資料庫
+    """
+    specs = DERIVED_METRICS[market]
+    lags = sorted({lag for _, lag, _ in specs})
+    n = len(points)
+
+    # 新增或被修正的觀測值，會影響自身及 lag 期之後的衍生欄位
+    dirty = set()
+    for i, (date, value) in enumerate(points):
+        if value is None:
+            continue
+        row = stored_rows.get(date)
+        if row is None or row.get('value') != value:
+            dirty.add(i)
+            dirty.update(i + lag for lag in lags if i + lag < n)
+        elif any(row.get(name) is None and i >= lag for name, lag, _ in specs):
+            dirty.add(i)
+
+    for i, (date, value) in enumerate(points):
+        if value is None:
+            continue
+        in_range = (start is None or date >= start) and (end is None or date <= end)
+        is_dirty = i in dirty
+        if not in_range and not (is_dirty and date in stored_rows):
+            continue
+        item = {'date': date, 'value': value}
+        for name, lag, method in specs:
+            if is_dirty:
+                prev = points[i - lag][1] if i >= lag else None
+                item[name] = _derive(method, value, prev)
+            else:
+                item[name] = stored_rows[date].get(name)
+        yield item, in_range, is_dirty
+
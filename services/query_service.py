@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+# 快取預設存活秒數
+DEFAULT_CACHE_TTL = 300
+# 快取筆數超過此值時清除已過期項目
+DEFAULT_CACHE_MAX_ENTRIES = 10000
+# 同時呼叫外部資料源的最大數量
+DEFAULT_MAX_CONCURRENCY = 8
+# 資料庫中的股票基本面在此秒數內視為最新，不重新向 yfinance 取得
+DEFAULT_STORE_MAX_AGE = 24 * 60 * 60
+
+# 與 CLI 相同的股票市場類型，market 會組成資料表名稱，僅接受此清單
+STOCK_MARKETS = ('tw', 'us', 'two', 'etf', 'index', 'crypto', 'forex', 'futures')
+MACRO_KINDS = ('cpi', 'nfp')
+COMMODITY_KINDS = ('oil', 'gold')
+
+
+class QueryService:
+    """
+    非同步查詢服務類
+    包裝 FundamentalDataService，提供記憶體快取與相同請求的合併 (single-flight)：
+    同一時間相同的查詢只會實際執行一次，其餘請求共用同一結果；
+    股票基本面優先讀取資料庫，過期或不存在時才向 yfinance 取得
+    """
+    def __init__(self, service=None, cache_ttl: float = DEFAULT_CACHE_TTL,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, store_max_age: int = DEFAULT_STORE_MAX_AGE):
+        if service is None:
+            from services.fundamental_data_service import FundamentalDataService
+            service = FundamentalDataService()
+        self.service = service
+        self.store_max_age = store_max_age
+        self.cache_ttl = cache_ttl
+        self.max_concurrency = max_concurrency
+        self._cache = {}
+        self._inflight = {}
+        self._semaphore = None
+
+    async def _run(self, key, func, *args):
+        """查詢快取，未命中時合併相同 key 的並行請求並在執行緒中執行 func"""
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        future = self._inflight.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 是發起請求者被取消 (而非本請求)，改由本請求重新執行
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    return await self._run(key, func, *args)
+                raise
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            async with self._semaphore:
+                result = await asyncio.to_thread(func, *args)
+        except BaseException as e:
+            # 包含 CancelledError: 第一個呼叫端被取消時，仍須結束共用的 future，避免其他等待者永久卡住
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # 避免無人等待時出現 "exception was never retrieved" 警告
+                future.exception()
+            raise
+        else:
+            if len(self._cache) >= DEFAULT_CACHE_MAX_ENTRIES:
+                now = time.monotonic()
+                self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            self._cache[key] = (time.monotonic() + self.cache_ttl, result)
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    @staticmethod
+    def _check_market(market: str):
+        if market not in STOCK_MARKETS:
+            raise ValueError(f"不支援的市場類型: {market}")
+
+    async def get_fundamentals(self, symbol: str, market: str):
+        """取得單一股票基本面資料 (優先讀取資料庫)"""
+        self._check_market(market)
+        return await self._run(
+            ('fundamentals', market, symbol), self.service.get_or_fetch_and_store, symbol, market, self.store_max_age
+        )
+
+    async def get_fundamentals_batch(self, symbols, market: str):
+        """並行取得多支股票基本面資料，回傳 (results, errors)"""
+        self._check_market(market)
+        symbols = list(dict.fromkeys(symbols))
+        outcomes = await asyncio.gather(
+            *(self.get_fundamentals(symbol, market) for symbol in symbols),
+            return_exceptions=True
+        )
+        results = {}
+        errors = {}
+        for symbol, outcome in zip(symbols, outcomes):
+            if isinstance(outcome, Exception):
+                errors[symbol] = str(outcome)
+            else:
+                results[symbol] = outcome
+        return results, errors
+
+    async def get_macro(self, kind: str, start_date=None, end_date=None):
+        """取得總經資料 (cpi/nfp)，未指定期間時回傳最新一筆"""
+        if kind not in MACRO_KINDS:
+            raise ValueError(f"不支援的總經指標: {kind}")
+        if start_date and end_date:
+            func = getattr(self.service, f'fetch_and_store_{kind}_us_range')
+            return await self._run(('macro', kind, start_date, end_date), func, start_date, end_date)
+        func = getattr(self.service, f'fetch_and_store_{kind}_us')
+        return await self._run(('macro', kind), func)
+
+    async def get_commodity(self, kind: str, start_date=None, end_date=None):
+        """取得大宗商品價格 (oil/gold)，未指定期間時回傳最新一筆"""
+        if kind not in COMMODITY_KINDS:
+            raise ValueError(f"不支援的大宗商品: {kind}")
+        if start_date and end_date:
+            func = getattr(self.service, f'fetch_and_store_{kind}_price_range')
+            return await self._run(('commodity', kind, start_date, end_date), func, start_date, end_date)
+        func = getattr(self.service, f'fetch_and_store_{kind}_price')
+        return await self._run(('commodity', kind), func)
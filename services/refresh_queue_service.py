@@ -0,0 +1,83 @@
+import os
+import socket
+import threading
+import time
+
+from repositories.job_queue_repository import JobQueueRepository
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_INTERVAL = 10
+
+
+class RefreshQueueService:
+    """
+    分散式股票更新服務類
+    coordinator 將 (symbol, market) 工作排入資料庫佇列，
+    任意數量的 worker (可位於不同主機) 分批領取並執行 fetch_and_store
+    """
+    def __init__(self, service=None, queue_repository=None, worker_id: str = None):
+        if service is None:
+            from services.fundamental_data_service import FundamentalDataService
+            service = FundamentalDataService()
+        self.service = service
+        self.queue = queue_repository or JobQueueRepository()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+    def enqueue(self, symbols, market: str):
+        """排入股票更新工作，回傳排入筆數"""
+        return self.queue.enqueue((symbol, market) for symbol in dict.fromkeys(symbols))
+
+    def _heartbeat_loop(self, job_ids, lease_seconds: int, stop: threading.Event):
+        # 每 1/3 租約時間續約一次，確保處理較慢時租約不會過期
+        interval = max(lease_seconds / 3, 1)
+        while not stop.wait(interval):
+            try:
+                self.queue.heartbeat(self.worker_id, job_ids, lease_seconds)
+            except Exception as e:
+                print(f"✗ [{self.worker_id}] 續約失敗: {str(e)}")
+
+    def run_worker(self, batch_size: int = DEFAULT_BATCH_SIZE, lease_seconds: int = DEFAULT_LEASE_SECONDS,
+                   max_attempts: int = DEFAULT_MAX_ATTEMPTS, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                   exit_when_idle: bool = True):
+        """
+        持續領取並處理工作
+        exit_when_idle 為 True 時佇列清空即結束，否則每 poll_interval 秒輪詢一次
+        回傳 {'done': 成功筆數, 'failed': 失敗筆數}
+        """
+        stats = {'done': 0, 'failed': 0}
+        while True:
+            self.queue.fail_exhausted(max_attempts)
+            jobs = self.queue.claim(self.worker_id, batch_size, lease_seconds, max_attempts)
+            if not jobs:
+                if exit_when_idle:
+                    return stats
+                time.sleep(poll_interval)
+                continue
+
+            stop = threading.Event()
+            heartbeat = threading.Thread(
+                target=self._heartbeat_loop,
+                args=([job_id for job_id, _, _ in jobs], lease_seconds, stop),
+                daemon=True
+            )
+            heartbeat.start()
+            try:
+                for job_id, symbol, market in jobs:
+                    try:
+                        self.service.fetch_and_store(symbol, market)
+                        self.queue.complete(self.worker_id, job_id)
+                        stats['done'] += 1
+                        print(f"✓ [{self.worker_id}] {symbol} ({market}) 已更新")
+                    except Exception as e:
+                        self.queue.fail(self.worker_id, job_id, str(e), max_attempts)
+                        stats['failed'] += 1
+                        print(f"✗ [{self.worker_id}] {symbol} ({market}) 處理失敗: {str(e)}")
+            finally:
+                stop.set()
+                heartbeat.join()
+
+    def get_status(self):
+        """回傳佇列各狀態的工作數量"""
+        return self.queue.get_status_counts()
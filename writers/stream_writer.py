@@ -0,0 +1,106 @@
+import csv
+import json
+import sys
+
+# arrow 輸出時為字串型別的欄位，其餘欄位皆視為 float64
+ARROW_STRING_FIELDS = {
+    'date', 'symbol', 'shortName', 'sector', 'industry',
+    'country', 'currency', 'financialCurrency', 'exchange', 'exDividendDate', 'baseCurrency',
+}
+
+
+class JsonlStreamWriter:
+    """逐筆輸出 JSON Lines"""
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, row: dict):
+        self.stream.write(json.dumps(row, ensure_ascii=False, default=str))
+        self.stream.write('\n')
+
+    def close(self):
+        self.stream.flush()
+
+
+class CsvStreamWriter:
+    """逐筆輸出 CSV，欄位以第一筆資料為準"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = None
+
+    def write(self, row: dict):
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.stream, fieldnames=list(row.keys()), extrasaction='ignore')
+            self.writer.writeheader()
+        self.writer.writerow(row)
+
+    def close(self):
+        self.stream.flush()
+
+
+class ArrowStreamWriter:
+    """以 Arrow IPC stream 格式分批輸出 (需安裝 pyarrow)"""
+    def __init__(self, stream, batch_size: int = 1000):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise Exception("arrow 輸出需要安裝 pyarrow 套件")
+        self.pa = pa
+        self.stream = stream
+        self.batch_size = batch_size
+        self.rows = []
+        self.schema = None
+        self.writer = None
+
+    def _flush_rows(self):
+        if not self.rows:
+            return
+        pa = self.pa
+        if self.schema is None:
+            self.schema = pa.schema([
+                (name, pa.string() if name in ARROW_STRING_FIELDS else pa.float64())
+                for name in self.rows[0].keys()
+            ])
+            self.writer = pa.ipc.new_stream(self.stream, self.schema)
+        batch = pa.RecordBatch.from_pylist(self.rows, schema=self.schema)
+        self.writer.write_batch(batch)
+        self.rows = []
+
+    def write(self, row: dict):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self._flush_rows()
+
+    def close(self):
+        self._flush_rows()
+        if self.writer is not None:
+            self.writer.close()
+        self.stream.flush()
+
+
+def open_stream_writer(output_format: str, output_file=None):
+    """
+    建立串流輸出器，回傳 (writer, stream)
+    output_file 為 None 時輸出至 stdout，呼叫端負責關閉非 stdout 的 stream
+    """
+    binary = output_format == 'arrow'
+    if output_file:
+        if binary:
+            stream = open(output_file, 'wb')
+        else:
+            stream = open(output_file, 'w', encoding='utf-8', newline='')
+    else:
+        stream = sys.stdout.buffer if binary else sys.stdout
+
+    try:
+        if output_format == 'jsonl':
+            return JsonlStreamWriter(stream), stream
+        if output_format == 'csv':
+            return CsvStreamWriter(stream), stream
+        if output_format == 'arrow':
+            return ArrowStreamWriter(stream), stream
+        raise Exception(f"不支援的輸出格式: {output_format}")
+    except Exception:
+        if output_file:
+            stream.close()
+        raise